@@ -1,260 +1,326 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from flask_jwt_extended import JWTManager, create_access_token, get_jwt, get_jwt_identity, verify_jwt_in_request
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import check_password_hash
+from cachetools import LRUCache, TLRUCache, TTLCache
+from functools import lru_cache, wraps
+import hashlib
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import psycopg
+from psycopg import sql
+from psycopg.rows import dict_row, tuple_row
+from psycopg.types.numeric import FloatLoader
+from psycopg_pool import ConnectionPool
+import orjson
+import base64
+from contextlib import contextmanager
 import os
+import threading
+import time
+from migrate import init_db
+
+# jsonify through orjson. Dates and datetimes are encoded natively as ISO
+# strings, matching the json_agg output of the list endpoints.
+class OrjsonProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
+# Brotli first for clients that accept it; tiny bodies aren't worth compressing
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
+
+# Client IPs come from X-Forwarded-For set by the platform's proxy (Render);
+# set TRUSTED_PROXY_COUNT=0 when serving clients directly
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 1))
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
+# Rate limits (login only). memory:// counts per worker process; point
+# RATELIMIT_STORAGE_URI at redis:// to share counters across workers.
+limiter = Limiter(
+    get_remote_address,
+    app=app,
+    storage_uri=os.environ.get('RATELIMIT_STORAGE_URI', 'memory://')
+)
+
+@app.errorhandler(429)
+def rate_limited(e):
+    return jsonify({'error': 'Too many attempts, try again later'}), 429
 
 # Configuration
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-this-in-production')
+# With an Ed25519 key pair in JWT_PRIVATE_KEY / JWT_PUBLIC_KEY (PEM), tokens
+# are signed with EdDSA instead of HS256. The keys are parsed once here so
+# PyJWT gets key objects and never re-parses PEM per request.
+if os.environ.get('JWT_PRIVATE_KEY') and os.environ.get('JWT_PUBLIC_KEY'):
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+    app.config['JWT_ALGORITHM'] = 'EdDSA'
+    app.config['JWT_PRIVATE_KEY'] = load_pem_private_key(os.environ['JWT_PRIVATE_KEY'].encode(), password=None)
+    app.config['JWT_PUBLIC_KEY'] = load_pem_public_key(os.environ['JWT_PUBLIC_KEY'].encode())
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 jwt = JWTManager(app)
 
-# Database connection with timeout
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(
-            os.environ.get('DATABASE_URL'),
-            connect_timeout=10,
-            cursor_factory=RealDictCursor
-        )
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
+# Verified tokens are cached per process for a few minutes, keyed on a hash
+# of the Authorization header, so repeat calls skip signature checking and
+# claim decoding. An entry never outlives its token's exp claim. Logged-out
+# tokens are remembered by jti until they would have expired anyway; logout
+# also records them in revoked_tokens, whose trigger notifies every worker's
+# change listener (which loads the table on connect). The in-process set is
+# bounded and starts empty in a new worker, so a full verification also
+# looks the jti up in revoked_tokens when the set doesn't have it.
+VERIFIED_TOKEN_TTL = 300
+_verified_tokens = TLRUCache(
+    maxsize=10000,
+    ttu=lambda key, entry, now: min(now + VERIFIED_TOKEN_TTL, entry[2]),
+    timer=time.time
+)
+_revoked_tokens = TTLCache(maxsize=100000, ttl=app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds())
+_token_cache_lock = threading.Lock()
+
+IS_TOKEN_REVOKED_SQL = 'SELECT 1 FROM revoked_tokens WHERE jti = %s AND expires_at > CURRENT_TIMESTAMP'
+
+@jwt.token_in_blocklist_loader
+def is_token_revoked(jwt_header, jwt_payload):
+    jti = jwt_payload['jti']
+    if jti in _revoked_tokens:
+        return True
+    # Only reached on a verified-token cache miss, so at most once per token
+    # every few minutes per worker
+    with db_cursor(row_factory=tuple_row) as (conn, cur):
+        cur.execute(IS_TOKEN_REVOKED_SQL, (jti,))
+        revoked = cur.fetchone() is not None
+    if revoked:
+        mark_token_revoked(jti)
+    return revoked
+
+def mark_token_revoked(jti):
+    with _token_cache_lock:
+        _revoked_tokens[jti] = True
+
+def _token_cache_key():
+    return hashlib.sha256(request.headers.get('Authorization', '').encode()).digest()
+
+# Drop-in for @jwt_required() that skips verification on a cache hit
+def jwt_cached(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        # Revocations from other workers arrive through the change listener
+        _ensure_change_listener()
+        key = _token_cache_key()
+        with _token_cache_lock:
+            entry = _verified_tokens.get(key)
+            if entry is not None and entry[1] in _revoked_tokens:
+                entry = None
+        if entry is None:
+            verify_jwt_in_request()
+            claims = get_jwt()
+            entry = (get_jwt_identity(), claims['jti'], claims['exp'])
+            with _token_cache_lock:
+                _verified_tokens[key] = entry
+        g.jwt_identity, g.jwt_jti, g.jwt_exp = entry
+        return fn(*args, **kwargs)
+    return wrapper
+
+def current_user_id():
+    return g.jwt_identity
+
+# Passwords are hashed with Argon2id (memory-hard, C implementation).
+# Hashes from before the switch are werkzeug pbkdf2 strings; they still
+# verify and are rehashed with Argon2id on the next successful login.
+# Parameters are the OWASP minimum (19 MiB, 2 passes, 1 lane) so concurrent
+# logins fit in a small instance's memory; hashes made with other
+# parameters are upgraded the same way.
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+def hash_password(password):
+    return password_hasher.hash(password)
+
+# Returns (matches, needs_rehash)
+def verify_password(stored_hash, password):
+    if stored_hash.startswith('$argon2'):
+        try:
+            password_hasher.verify(stored_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False, False
+        return True, password_hasher.check_needs_rehash(stored_hash)
+    return check_password_hash(stored_hash, password), True
+
+# Settings for every pooled connection. With the default
+# DB_PREPARE_THRESHOLD=1 a statement is prepared server-side on its second
+# execution on a connection (0 would prepare on first use, including
+# one-off queries); the handlers run a small fixed set of queries and the
+# pool keeps sessions alive, so parse/plan is paid about once per
+# connection.
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 5000))
+# A streamed page keeps its read transaction open while the client reads;
+# past this the server ends the session so slow readers can't pin the pool
+DB_STREAM_IDLE_TIMEOUT_MS = int(os.environ.get('DB_STREAM_IDLE_TIMEOUT_MS', 30000))
+
+# DATABASE_URL may point at pgbouncer in transaction mode (PGBOUNCER=1, see
+# pgbouncer.ini). Server sessions are then shared between clients, so the
+# startup `options` are not sent (set statement_timeout in pgbouncer's
+# connect_query instead) and server-side prepared statements are off unless
+# DB_PREPARE_THRESHOLD is set (pgbouncer >= 1.21 with max_prepared_statements).
+# LISTEN and migrations need a real session: DATABASE_DIRECT_URL.
+BEHIND_PGBOUNCER = os.environ.get('PGBOUNCER') == '1'
+_prepare_threshold = os.environ.get('DB_PREPARE_THRESHOLD', 'none' if BEHIND_PGBOUNCER else '1')
+DB_PREPARE_THRESHOLD = None if _prepare_threshold.lower() == 'none' else int(_prepare_threshold)
+
+# Long-lived connections idling behind a NAT or load balancer can be dropped
+# silently; keepalives and tcp_user_timeout make the next use fail in seconds
+# instead of hanging on TCP retransmits
+DB_KEEPALIVE_KWARGS = {
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 3,
+    'tcp_user_timeout': 10000,
+}
+
+DB_CONNECT_KWARGS = {
+    'row_factory': dict_row,
+    # Each handler statement commits on its own: no BEGIN/COMMIT round-trips
+    # and no idle-in-transaction sessions. Multi-statement work opens an
+    # explicit conn.transaction().
+    'autocommit': True,
+    'connect_timeout': 10,
+    'prepare_threshold': DB_PREPARE_THRESHOLD,
+    **DB_KEEPALIVE_KWARGS,
+}
+if not BEHIND_PGBOUNCER:
+    # A runaway query must not be able to hold a worker forever
+    DB_CONNECT_KWARGS['options'] = f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+
+# NUMERIC columns come back as float rather than Decimal, so rows returned
+# through jsonify stay on orjson's native fast path. Amounts are
+# NUMERIC(10, 2), well within float precision; sums that need exact
+# arithmetic are done in SQL.
+def configure_connection(conn):
+    conn.adapters.register_loader('numeric', FloatLoader)
+
+def direct_database_url():
+    return os.environ.get('DATABASE_DIRECT_URL') or os.environ.get('DATABASE_URL')
+
+# Connection pool - created lazily so every gunicorn worker opens its own
+# sockets instead of inheriting the preloaded master's
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 2))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 20))
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    min_size=DB_POOL_MIN,
+                    max_size=DB_POOL_MAX,
+                    kwargs=DB_CONNECT_KWARGS,
+                    configure=configure_connection,
+                    # Cheap liveness check on checkout; dead sockets are replaced
+                    check=ConnectionPool.check_connection,
+                    open=True
+                )
+    return _pool
+
+# Close the pool's connections and background workers (gunicorn worker_exit)
+def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+class DatabaseUnavailable(Exception):
+    pass
 
-# Initialize database schema
-def init_db():
-    """Run the complete PostgreSQL schema"""
-    conn = get_db_connection()
+# Request-scoped connection, returned to the pool on teardown
+def get_db():
+    if 'db' not in g:
+        try:
+            g.db = get_pool().getconn()
+        except Exception:
+            app.logger.exception("Database connection error")
+            return None
+    return g.db
+
+@app.teardown_request
+def release_db(exc):
+    conn = g.pop('db', None)
+    if conn is not None:
+        if exc is not None:
+            conn.close()
+        get_pool().putconn(conn)
+
+# Cursor on the request's pooled connection, closed when the block exits.
+# Connections are in autocommit; with transaction=True the block runs in one
+# transaction, committed on exit and rolled back if it raises.
+@contextmanager
+def db_cursor(row_factory=None, transaction=False):
+    conn = get_db()
     if not conn:
-        print("❌ Cannot connect to database")
-        return
-    
+        raise DatabaseUnavailable('Database connection failed')
+    cur = conn.cursor(row_factory=row_factory) if row_factory else conn.cursor()
     try:
-        cur = conn.cursor()
-        print("📦 Creating database schema...")
-        
-        # Enable UUID extension
-        cur.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp"')
-        
-        # Users Table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                name VARCHAR(100) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
-        print("✅ Users table created")
-        
-        # Transactions Table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                type VARCHAR(10) NOT NULL CHECK (type IN ('income', 'expense')),
-                category VARCHAR(50) NOT NULL,
-                amount NUMERIC(10, 2) NOT NULL,
-                transaction_date DATE NOT NULL,
-                description TEXT,
-                merchant VARCHAR(100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(user_id, transaction_date)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(category)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions(type)')
-        print("✅ Transactions table created")
-        
-        # Budgets Table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS budgets (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                category VARCHAR(50) NOT NULL,
-                limit_amount NUMERIC(10, 2) NOT NULL,
-                period VARCHAR(10) DEFAULT 'monthly' CHECK (period IN ('monthly', 'yearly')),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                UNIQUE (user_id, category)
-            )
-        ''')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_budgets_user ON budgets(user_id)')
-        print("✅ Budgets table created")
-        
-        # Savings Goals Table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS savings_goals (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                goal_name VARCHAR(100) NOT NULL,
-                target_amount NUMERIC(10, 2) NOT NULL,
-                current_amount NUMERIC(10, 2) DEFAULT 0.00,
-                deadline DATE NOT NULL,
-                status VARCHAR(20) DEFAULT 'active' CHECK (status IN ('active', 'completed', 'cancelled')),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_savings_goals_user ON savings_goals(user_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_savings_goals_status ON savings_goals(status)')
-        print("✅ Savings goals table created")
-        
-        # Categories Reference Table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(50) UNIQUE NOT NULL,
-                type VARCHAR(10) DEFAULT 'both' CHECK (type IN ('income', 'expense', 'both')),
-                icon VARCHAR(50),
-                color VARCHAR(20),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        print("✅ Categories table created")
-        
-        # Insert default categories
-        cur.execute('''
-            INSERT INTO categories (name, type, icon, color) 
-            SELECT * FROM (VALUES
-                ('Salary', 'income', 'briefcase', '#10b981'),
-                ('Freelance', 'income', 'laptop', '#3b82f6'),
-                ('Investments', 'income', 'trending-up', '#8b5cf6'),
-                ('Other Income', 'income', 'dollar-sign', '#06b6d4'),
-                ('Food & Dining', 'expense', 'utensils', '#ef4444'),
-                ('Transportation', 'expense', 'car', '#f59e0b'),
-                ('Shopping', 'expense', 'shopping-bag', '#ec4899'),
-                ('Entertainment', 'expense', 'film', '#8b5cf6'),
-                ('Utilities', 'expense', 'zap', '#10b981'),
-                ('Healthcare', 'expense', 'heart', '#ef4444'),
-                ('Education', 'expense', 'book', '#3b82f6'),
-                ('Travel', 'expense', 'plane', '#06b6d4'),
-                ('Insurance', 'expense', 'shield', '#6366f1'),
-                ('Subscriptions', 'expense', 'refresh-cw', '#f59e0b'),
-                ('Other', 'both', 'more-horizontal', '#6b7280')
-            ) AS v(name, type, icon, color)
-            WHERE NOT EXISTS (
-                SELECT 1 FROM categories WHERE categories.name = v.name
-            )
-        ''')
-        print("✅ Default categories inserted")
-        
-        # Notifications Table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS notifications (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                title VARCHAR(200) NOT NULL,
-                message TEXT NOT NULL,
-                type VARCHAR(20) NOT NULL CHECK (type IN ('budget_alert', 'goal_reminder', 'insight', 'general')),
-                is_read BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_notifications_user_read ON notifications(user_id, is_read)')
-        print("✅ Notifications table created")
-        
-        # User Preferences Table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS user_preferences (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER UNIQUE NOT NULL,
-                currency VARCHAR(10) DEFAULT 'INR',
-                budget_alert_threshold INTEGER DEFAULT 80,
-                enable_notifications BOOLEAN DEFAULT TRUE,
-                theme VARCHAR(10) DEFAULT 'light' CHECK (theme IN ('light', 'dark', 'auto')),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
-        print("✅ User preferences table created")
-        
-        # Recurring Transactions Table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS recurring_transactions (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                type VARCHAR(10) NOT NULL CHECK (type IN ('income', 'expense')),
-                category VARCHAR(50) NOT NULL,
-                amount NUMERIC(10, 2) NOT NULL,
-                description TEXT,
-                merchant VARCHAR(100),
-                frequency VARCHAR(10) NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly', 'yearly')),
-                start_date DATE NOT NULL,
-                end_date DATE,
-                is_active BOOLEAN DEFAULT TRUE,
-                last_processed DATE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_recurring_transactions_user_active ON recurring_transactions(user_id, is_active)')
-        print("✅ Recurring transactions table created")
-        
-        # Financial Insights Cache Table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS insights_cache (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                insight_type VARCHAR(50) NOT NULL,
-                insight_data JSONB NOT NULL,
-                valid_until TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_insights_cache_user_type ON insights_cache(user_id, insight_type)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_insights_cache_valid ON insights_cache(valid_until)')
-        print("✅ Insights cache table created")
-        
-        # Create trigger function for updated_at
-        cur.execute('''
-            CREATE OR REPLACE FUNCTION update_updated_at_column()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                NEW.updated_at = CURRENT_TIMESTAMP;
-                RETURN NEW;
-            END;
-            $$ LANGUAGE plpgsql
-        ''')
-        
-        # Apply triggers
-        tables_with_updated_at = ['users', 'transactions', 'budgets', 'savings_goals', 'user_preferences', 'recurring_transactions']
-        for table in tables_with_updated_at:
-            cur.execute(f'''
-                DROP TRIGGER IF EXISTS update_{table}_updated_at ON {table};
-                CREATE TRIGGER update_{table}_updated_at 
-                BEFORE UPDATE ON {table}
-                FOR EACH ROW EXECUTE FUNCTION update_updated_at_column()
-            ''')
-        print("✅ Triggers created")
-        
-        conn.commit()
-        cur.close()
-        print("✅ Database schema initialized successfully!")
-        
-    except Exception as e:
-        print(f"❌ Database initialization error: {e}")
-        conn.rollback()
+        if transaction:
+            with conn.transaction():
+                yield conn, cur
+        else:
+            yield conn, cur
     finally:
-        conn.close()
+        cur.close()
+
+# Parse client-supplied amounts/dates into Decimal/date so psycopg can send
+# them as binary NUMERIC/DATE instead of text PostgreSQL has to re-parse
+def parse_amount(value):
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {value}')
+    if not amount.is_finite():
+        raise ValueError(f'Invalid amount: {value}')
+    return amount
+
+def parse_date(value):
+    if not value:
+        return datetime.now().date()
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid date: {value}')
+
+# Build a {key: ...} response from JSON text PostgreSQL already rendered
+# (json_agg), skipping per-row dict construction and re-encoding in Python
+def json_text_response(key, json_text, **extra):
+    body = '{"%s":%s' % (key, json_text)
+    for name, value in extra.items():
+        body += ',"%s":%s' % (name, orjson.dumps(value).decode())
+    return app.response_class(body + '}', mimetype='application/json')
+
+# Seconds the health check waits for a pooled connection
+HEALTH_CHECK_TIMEOUT = 2
 
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
@@ -262,10 +328,16 @@ def init_db():
 def health_check():
     db_status = 'disconnected'
     try:
-        conn = get_db_connection()
-        if conn:
-            conn.close()
+        # Probe a pooled connection instead of opening a new one per check.
+        # Give up quickly when the pool is exhausted or the database is down,
+        # well inside load balancer probe timeouts
+        pool = get_pool()
+        conn = pool.getconn(timeout=HEALTH_CHECK_TIMEOUT)
+        try:
+            conn.execute('SELECT 1').fetchone()
             db_status = 'connected'
+        finally:
+            pool.putconn(conn)
     except:
         pass
     
@@ -275,6 +347,11 @@ def health_check():
         'timestamp': datetime.now().isoformat()
     }), 200
 
+# Readiness probe - never touches the database
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    return jsonify({'status': 'ready'}), 200
+
 # Register endpoint - UPDATED TO MATCH SCHEMA
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -292,35 +369,27 @@ def register():
         if not all([name, email, password]):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        # Hash before checking out a connection; Argon2 is deliberately slow
+        password_hash = hash_password(password)
         
-        try:
-            cur = conn.cursor()
-            
-            # Check if user exists
-            cur.execute('SELECT id FROM users WHERE email = %s', (email,))
-            if cur.fetchone():
-                return jsonify({'error': 'User already exists'}), 409
-            
-            # Create user
-            password_hash = generate_password_hash(password)
-            cur.execute(
-                'INSERT INTO users (name, email, password_hash) VALUES (%s, %s, %s) RETURNING id, name, email',
-                (name, email, password_hash)
-            )
+        with db_cursor() as (conn, cur):
+            # Create the user and default preferences in one round-trip. An
+            # existing email, in any letter case, inserts nothing and returns no row.
+            cur.execute('''
+                WITH new_user AS (
+                    INSERT INTO users (name, email, password_hash) VALUES (%s, %s, %s)
+                    ON CONFLICT ((lower(email))) DO NOTHING
+                    RETURNING id, name, email
+                ), prefs AS (
+                    INSERT INTO user_preferences (user_id) SELECT id FROM new_user
+                )
+                SELECT id, name, email FROM new_user
+            ''', (name, email, password_hash))
             user = cur.fetchone()
+            if not user:
+                return jsonify({'error': 'User already exists'}), 409
             user_id = user['id']
             
-            # Create default user preferences
-            cur.execute(
-                'INSERT INTO user_preferences (user_id) VALUES (%s)',
-                (user_id,)
-            )
-            
-            conn.commit()
-            
             # Create access token
             access_token = create_access_token(identity=user_id)
             
@@ -334,21 +403,36 @@ def register():
                 }
             }), 201
             
-        finally:
-            cur.close()
-            conn.close()
-            
     except Exception as e:
-        print(f"Registration error: {e}")
+        app.logger.exception("Registration error")
         return jsonify({'error': str(e)}), 500
 
+# Hot queries live in module constants so every call sends the same text;
+# psycopg keys its per-connection prepared statements on it (see
+# DB_PREPARE_THRESHOLD), so each is parsed and planned once per connection
+LOGIN_SQL = 'SELECT id, name, email, password_hash FROM users WHERE lower(email) = lower(%s)'
+
+# Only failed logins count against the limits; a tripped limit is rejected
+# before any password hash is verified
+def _login_failed(response):
+    return response.status_code == 401
+
+def _login_email_key():
+    data = request.get_json(silent=True)
+    # A JSON list or string body has no email to key on
+    if not isinstance(data, dict):
+        data = {}
+    return str(data.get('email') or data.get('username') or '').lower()
+
 # Login endpoint - UPDATED TO MATCH SCHEMA
 @app.route('/api/auth/login', methods=['POST'])
+@limiter.limit('5/minute', deduct_when=_login_failed)
+@limiter.limit('20/hour', key_func=_login_email_key, deduct_when=_login_failed)
 def login():
     try:
         data = request.get_json()
         
-        if not data:
+        if not data or not isinstance(data, dict):
             return jsonify({'error': 'No data provided'}), 400
         
         # Accept either email or username (treat username as email)
@@ -358,18 +442,23 @@ def login():
         if not all([email, password]):
             return jsonify({'error': 'Missing credentials'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        try:
-            cur = conn.cursor()
-            cur.execute('SELECT id, name, email, password_hash FROM users WHERE email = %s', (email,))
+        with db_cursor() as (conn, cur):
+            cur.execute(LOGIN_SQL, (email,))
             user = cur.fetchone()
             
-            if not user or not check_password_hash(user['password_hash'], password):
+            if not user:
+                return jsonify({'error': 'Invalid credentials'}), 401
+            
+            matches, needs_rehash = verify_password(user['password_hash'], password)
+            if not matches:
                 return jsonify({'error': 'Invalid credentials'}), 401
             
+            if needs_rehash:
+                cur.execute(
+                    'UPDATE users SET password_hash = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s',
+                    (hash_password(password), user['id'])
+                )
+            
             access_token = create_access_token(identity=user['id'])
             
             return jsonify({
@@ -382,83 +471,343 @@ def login():
                 }
             }), 200
             
-        finally:
-            cur.close()
-            conn.close()
+    except Exception as e:
+        app.logger.exception("Login error")
+        return jsonify({'error': str(e)}), 500
+
+# Records a revoked token (its insert trigger notifies every worker) and
+# prunes rows for tokens that have expired anyway
+REVOKE_TOKEN_SQL = '''
+    WITH expired AS (
+        DELETE FROM revoked_tokens WHERE expires_at < CURRENT_TIMESTAMP
+    )
+    INSERT INTO revoked_tokens (jti, expires_at) VALUES (%(jti)s, to_timestamp(%(exp)s))
+    ON CONFLICT (jti) DO NOTHING
+'''
+
+# Logout - revokes the presented token in every worker
+@app.route('/api/auth/logout', methods=['POST'])
+@jwt_cached
+def logout():
+    try:
+        mark_token_revoked(g.jwt_jti)
+        with _token_cache_lock:
+            _verified_tokens.pop(_token_cache_key(), None)
+        
+        with db_cursor() as (conn, cur):
+            cur.execute(REVOKE_TOKEN_SQL, {'jti': g.jwt_jti, 'exp': g.jwt_exp})
+        
+        return jsonify({'message': 'Logged out successfully'}), 200
             
     except Exception as e:
-        print(f"Login error: {e}")
+        app.logger.exception("Logout error")
         return jsonify({'error': str(e)}), 500
 
+# Categories only change through migrations, so cache the rendered JSON per
+# type filter. A trigger on the table sends pg_notify('categories_changed')
+# and a per-process listener thread drops the cache when it fires.
+CATEGORY_TYPES = (None, 'income', 'expense', 'both')
+_category_cache = {}
+
+# Swap in a fresh dict rather than clearing: a read that raced the change
+# still holds the old one, so its stale result is never served
+def invalidate_category_cache():
+    global _category_cache
+    _category_cache = {}
+
+# Rendered transaction pages per user: {user_id: {(limit, fields, before): page}}.
+# Each user keeps only their most recently used pages, so paging through a
+# long history (every cursor is a new key) can't grow the cache unbounded.
+# Writes through this worker drop the user's entry directly; triggers on the
+# table send pg_notify('transactions_changed', user_id) so every other
+# worker's listener drops it too.
+TRANSACTIONS_CACHE_PAGES = 8
+_transactions_cache = TTLCache(maxsize=10000, ttl=60)
+_transactions_cache_lock = threading.Lock()
+
+def transactions_cache_pages(user_id):
+    with _transactions_cache_lock:
+        pages = _transactions_cache.get(int(user_id))
+        if pages is None:
+            pages = _transactions_cache[int(user_id)] = LRUCache(maxsize=TRANSACTIONS_CACHE_PAGES)
+        return pages
+
+def invalidate_transactions_cache(user_id):
+    with _transactions_cache_lock:
+        _transactions_cache.pop(int(user_id), None)
+
+def _clear_change_caches():
+    invalidate_category_cache()
+    with _transactions_cache_lock:
+        _transactions_cache.clear()
+    # Revocations may be missed while the listener is down; re-verifying
+    # sends each token through the revoked_tokens lookup
+    with _token_cache_lock:
+        _verified_tokens.clear()
+
+_change_listener = None
+_change_listener_lock = threading.Lock()
+
+def _listen_for_changes():
+    while True:
+        try:
+            with psycopg.connect(
+                direct_database_url(), autocommit=True, connect_timeout=10, **DB_KEEPALIVE_KWARGS
+            ) as conn:
+                conn.execute('LISTEN categories_changed')
+                conn.execute('LISTEN transactions_changed')
+                conn.execute('LISTEN tokens_revoked')
+                # Anything cached before LISTEN took effect may already be
+                # stale, and logouts may have happened in other workers
+                _clear_change_caches()
+                for (jti,) in conn.execute(
+                    'SELECT jti FROM revoked_tokens WHERE expires_at > CURRENT_TIMESTAMP'
+                ):
+                    mark_token_revoked(jti)
+                for notify in conn.notifies():
+                    if notify.channel == 'transactions_changed':
+                        invalidate_transactions_cache(notify.payload)
+                    elif notify.channel == 'tokens_revoked':
+                        mark_token_revoked(notify.payload)
+                    else:
+                        invalidate_category_cache()
+        except Exception:
+            app.logger.exception("Change listener error")
+        _clear_change_caches()
+        time.sleep(5)
+
+def _ensure_change_listener():
+    # Threads don't survive fork, so each worker starts its own on first use
+    global _change_listener
+    if _change_listener is None or not _change_listener.is_alive():
+        with _change_listener_lock:
+            if _change_listener is None or not _change_listener.is_alive():
+                _change_listener = threading.Thread(
+                    target=_listen_for_changes, name='change-listener', daemon=True
+                )
+                _change_listener.start()
+
 # Get categories
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
     try:
         category_type = request.args.get('type')  # 'income', 'expense', or None for all
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        _ensure_change_listener()
+        # Taken before querying, like the transaction pages, so an
+        # invalidation meanwhile leaves this result in the discarded dict
+        cache = _category_cache
+        cached = cache.get(category_type)
+        if cached is not None:
+            return json_text_response('categories', cached), 200
         
-        try:
-            cur = conn.cursor()
+        with db_cursor(row_factory=tuple_row) as (conn, cur):
             if category_type:
                 cur.execute(
-                    "SELECT * FROM categories WHERE type = %s OR type = 'both' ORDER BY name",
+                    "SELECT COALESCE(json_agg(c ORDER BY name), '[]')::text FROM categories c WHERE type = %s OR type = 'both'",
                     (category_type,)
                 )
             else:
-                cur.execute('SELECT * FROM categories ORDER BY type, name')
+                cur.execute("SELECT COALESCE(json_agg(c ORDER BY type, name), '[]')::text FROM categories c")
             
-            categories = cur.fetchall()
-            return jsonify({'categories': categories}), 200
-            
-        finally:
-            cur.close()
-            conn.close()
+            categories = cur.fetchone()[0]
+            if category_type in CATEGORY_TYPES:
+                cache[category_type] = categories
+            return json_text_response('categories', categories), 200
             
     except Exception as e:
-        print(f"Get categories error: {e}")
+        app.logger.exception("Get categories error")
         return jsonify({'error': str(e)}), 500
 
+# Columns a client may pick with ?fields=a,b; unknown names are ignored.
+# Projections are composed from this whitelist only, never from user input.
+TRANSACTION_FIELDS = (
+    'id', 'user_id', 'type', 'category', 'amount', 'transaction_date',
+    'description', 'merchant', 'created_at', 'updated_at'
+)
+
+# Pages are ordered newest first on (transaction_date, created_at, id), a
+# total order (bulk imports share created_at), and continue from the last
+# row's key with ?before=<next_cursor> instead of an OFFSET. The page
+# carries only the requested columns plus that key.
+LIST_TRANSACTIONS_SQL = sql.SQL('''
+    WITH page AS (
+        SELECT {page_columns} FROM transactions
+        WHERE user_id = %(user_id)s{before}
+        ORDER BY transaction_date DESC, created_at DESC, id DESC
+        LIMIT %(limit)s
+    )
+    SELECT
+        (SELECT COALESCE(json_agg(
+            (SELECT r FROM (SELECT {columns}) r) ORDER BY t.transaction_date DESC, t.created_at DESC, t.id DESC
+        ), '[]')::text FROM page t),
+        (SELECT COUNT(*) FROM page),
+        last.transaction_date, last.created_at, last.id
+    FROM (SELECT 1) one
+    LEFT JOIN LATERAL (
+        SELECT transaction_date, created_at, id FROM page
+        ORDER BY transaction_date, created_at, id
+        LIMIT 1
+    ) last ON true
+''')
+
+# Larger pages are streamed from a server-side cursor in chunks instead of
+# being aggregated into one JSON string in memory
+STREAM_TRANSACTIONS_THRESHOLD = 500
+MAX_TRANSACTIONS_LIMIT = 10000
+STREAM_FETCH_SIZE = 500
+STREAM_TRANSACTIONS_SQL = sql.SQL('''
+    SELECT (SELECT row_to_json(r) FROM (SELECT {columns}) r)::text, transaction_date, created_at, id
+    FROM transactions t
+    WHERE user_id = %(user_id)s{before}
+    ORDER BY transaction_date DESC, created_at DESC, id DESC
+    LIMIT %(limit)s
+''')
+
+TRANSACTIONS_KEY_FIELDS = ('transaction_date', 'created_at', 'id')
+TRANSACTIONS_BEFORE_SQL = sql.SQL('''
+        AND (transaction_date, created_at, id) < (%(before_date)s, %(before_created_at)s, %(before_id)s)''')
+
+def parse_transaction_fields(value):
+    if not value:
+        return TRANSACTION_FIELDS
+    requested = {field.strip() for field in value.split(',')}
+    return tuple(field for field in TRANSACTION_FIELDS if field in requested) or TRANSACTION_FIELDS
+
+# Composed once per distinct shape so repeat requests send identical query
+# text and reuse the connection's prepared statement
+@lru_cache(maxsize=None)
+def transactions_sql(fields, stream, paged):
+    columns = sql.SQL(', ').join(sql.Identifier('t', field) for field in fields)
+    before = TRANSACTIONS_BEFORE_SQL if paged else sql.SQL('')
+    if stream:
+        return STREAM_TRANSACTIONS_SQL.format(columns=columns, before=before)
+    page_fields = [field for field in TRANSACTION_FIELDS if field in fields or field in TRANSACTIONS_KEY_FIELDS]
+    return LIST_TRANSACTIONS_SQL.format(
+        page_columns=sql.SQL(', ').join(map(sql.Identifier, page_fields)),
+        columns=columns,
+        before=before
+    )
+
+def encode_transactions_cursor(transaction_date, created_at, transaction_id):
+    key = f'{transaction_date.isoformat()}|{created_at.isoformat()}|{transaction_id}'
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_transactions_cursor(value):
+    try:
+        transaction_date, created_at, transaction_id = base64.urlsafe_b64decode(value).decode().split('|')
+        return {
+            'before_date': date.fromisoformat(transaction_date),
+            'before_created_at': datetime.fromisoformat(created_at),
+            'before_id': int(transaction_id),
+        }
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def _stream_transaction_rows(cur, limit):
+    yield '{"transactions":['
+    sep = ''
+    count = 0
+    last = None
+    while True:
+        rows = cur.fetchmany(STREAM_FETCH_SIZE)
+        if not rows:
+            break
+        yield sep + ','.join(row[0] for row in rows)
+        sep = ','
+        count += len(rows)
+        last = rows[-1]
+    next_cursor = encode_transactions_cursor(*last[1:]) if count and count == limit else None
+    yield '],"next_cursor":%s}' % orjson.dumps(next_cursor).decode()
+
+# The body is sent after teardown_request has run, so a streamed response
+# owns its connection and hands it back once the server closes the response
+def stream_json_response(conn, cur, chunks):
+    g.pop('db', None)
+
+    def release():
+        try:
+            cur.close()
+            # End the read-only transaction holding the cursor open. COMMIT,
+            # not ROLLBACK: psycopg drops its prepared statements on rollback
+            conn.commit()
+        except Exception:
+            conn.close()
+        get_pool().putconn(conn)
+
+    response = app.response_class(chunks, mimetype='application/json')
+    response.call_on_close(release)
+    return response
+
 # Get all transactions
 @app.route('/api/transactions', methods=['GET'])
-@jwt_required()
+@jwt_cached
 def get_transactions():
     try:
-        user_id = get_jwt_identity()
-        limit = request.args.get('limit', 100, type=int)
+        user_id = current_user_id()
+        limit = min(max(request.args.get('limit', 100, type=int), 0), MAX_TRANSACTIONS_LIMIT)
+        fields = parse_transaction_fields(request.args.get('fields'))
+        before = request.args.get('before')
+        stream = limit > STREAM_TRANSACTIONS_THRESHOLD
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        params = {'user_id': user_id, 'limit': limit}
+        if before:
+            try:
+                params.update(decode_transactions_cursor(before))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        query = transactions_sql(fields, stream, bool(before))
         
-        try:
-            cur = conn.cursor()
-            cur.execute('''
-                SELECT * FROM transactions
-                WHERE user_id = %s
-                ORDER BY transaction_date DESC, created_at DESC
-                LIMIT %s
-            ''', (user_id, limit))
-            transactions = cur.fetchall()
-            
-            return jsonify({'transactions': transactions}), 200
+        if stream:
+            conn = get_db()
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
+            # Named cursors only live inside a transaction block
+            conn.execute(
+                "BEGIN; SET LOCAL idle_in_transaction_session_timeout = %d" % DB_STREAM_IDLE_TIMEOUT_MS,
+                prepare=False
+            )
+            cur = conn.cursor('tx_stream', row_factory=tuple_row)
+            cur.execute(query, params)
+            return stream_json_response(conn, cur, _stream_transaction_rows(cur, limit)), 200
+        
+        _ensure_change_listener()
+        # The per-user pages go into the cache before querying: if a write
+        # invalidates them meanwhile, this page lands in the detached copy
+        pages = transactions_cache_pages(user_id)
+        with _transactions_cache_lock:
+            cached = pages.get((limit, fields, before))
+        if cached is None:
+            with db_cursor(row_factory=tuple_row) as (conn, cur):
+                cur.execute(query, params)
+                transactions, count, *last = cur.fetchone()
             
-        finally:
-            cur.close()
-            conn.close()
+            # An empty page (limit=0) has no last row to continue from
+            next_cursor = encode_transactions_cursor(*last) if count and count == limit else None
+            cached = (transactions, next_cursor)
+            with _transactions_cache_lock:
+                pages[(limit, fields, before)] = cached
+        
+        transactions, next_cursor = cached
+        return json_text_response('transactions', transactions, next_cursor=next_cursor), 200
             
     except Exception as e:
-        print(f"Get transactions error: {e}")
+        app.logger.exception("Get transactions error")
         return jsonify({'error': str(e)}), 500
 
+INSERT_TRANSACTION_SQL = '''
+    INSERT INTO transactions
+    (user_id, type, category, amount, transaction_date, description, merchant)
+    VALUES (%s, %s, %s, %b, %b, %s, %s)
+    RETURNING id, user_id, type, category, amount, transaction_date, description, merchant, created_at
+'''
+
 # Add transaction
 @app.route('/api/transactions', methods=['POST'])
-@jwt_required()
+@jwt_cached
 def add_transaction():
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         data = request.get_json()
         
         if not data:
@@ -467,110 +816,183 @@ def add_transaction():
         amount = data.get('amount')
         category = data.get('category')
         transaction_type = data.get('type')
-        transaction_date = data.get('date') or datetime.now().date().isoformat()
         description = data.get('description', '')
         merchant = data.get('merchant', '')
         
         if not all([amount, category, transaction_type]):
             return jsonify({'error': 'Missing required fields (amount, category, type)'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
         try:
-            cur = conn.cursor()
-            
+            amount = parse_amount(amount)
+            # The frontend sends transaction_date; bulk import accepts both too
+            transaction_date = parse_date(data.get('date') or data.get('transaction_date'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        with db_cursor() as (conn, cur):
             # Insert transaction
             cur.execute(
-                '''INSERT INTO transactions 
-                   (user_id, type, category, amount, transaction_date, description, merchant)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s) 
-                   RETURNING id, user_id, type, category, amount, transaction_date, description, merchant, created_at''',
+                INSERT_TRANSACTION_SQL,
                 (user_id, transaction_type, category, amount, transaction_date, description, merchant)
             )
             transaction = cur.fetchone()
-            
-            conn.commit()
+            invalidate_transactions_cache(user_id)
             
             return jsonify({
                 'message': 'Transaction added successfully',
                 'transaction': transaction
             }), 201
             
-        finally:
-            cur.close()
-            conn.close()
-            
     except Exception as e:
-        print(f"Add transaction error: {e}")
+        app.logger.exception("Add transaction error")
+        return jsonify({'error': str(e)}), 500
+
+# Imports larger than this go through COPY instead of a batched INSERT.
+# COPY can't return ids, so it fills a temp table that one INSERT ... SELECT
+# moves into transactions; ord keeps the returned ids in input order.
+BULK_COPY_THRESHOLD = 1000
+TRANSACTION_COPY_TYPES = ['int4', 'varchar', 'varchar', 'numeric', 'date', 'text', 'varchar']
+BULK_COPY_STAGING_SQL = '''
+    CREATE TEMP TABLE transactions_import (
+        ord BIGSERIAL,
+        user_id INTEGER,
+        type VARCHAR(10),
+        category VARCHAR(50),
+        amount NUMERIC(10, 2),
+        transaction_date DATE,
+        description TEXT,
+        merchant VARCHAR(100)
+    ) ON COMMIT DROP
+'''
+BULK_COPY_INSERT_SQL = '''
+    INSERT INTO transactions
+    (user_id, type, category, amount, transaction_date, description, merchant)
+    SELECT user_id, type, category, amount, transaction_date, description, merchant
+    FROM transactions_import
+    ORDER BY ord
+    RETURNING id
+'''
+BULK_INSERT_TRANSACTION_SQL = '''
+    INSERT INTO transactions
+    (user_id, type, category, amount, transaction_date, description, merchant)
+    VALUES (%s, %s, %s, %b, %b, %s, %s)
+    RETURNING id
+'''
+
+# Bulk add transactions (CSV import, recurring transactions)
+@app.route('/api/transactions/bulk', methods=['POST'])
+@jwt_cached
+def add_transactions_bulk():
+    try:
+        user_id = current_user_id()
+        data = request.get_json()
+        # Either a bare list or {"transactions": [...]}
+        if isinstance(data, dict):
+            data = data.get('transactions')
+
+        if not data or not isinstance(data, list):
+            return jsonify({'error': 'Expected a list of transactions'}), 400
+
+        rows = []
+        for t in data:
+            if not isinstance(t, dict) or not all([t.get('amount'), t.get('category'), t.get('type')]):
+                return jsonify({'error': 'Missing required fields (amount, category, type)'}), 400
+            try:
+                rows.append((
+                    int(user_id), t['type'], t['category'], parse_amount(t['amount']),
+                    # transaction_date matches the list endpoint's output,
+                    # so exported rows can be re-imported as they are
+                    parse_date(t.get('date') or t.get('transaction_date')),
+                    t.get('description', ''), t.get('merchant', '')
+                ))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+        # One transaction, so a failed import leaves no partial rows. Only the
+        # returned ids are read, so rows come back as tuples, not dicts
+        with db_cursor(row_factory=tuple_row, transaction=True) as (conn, cur):
+            if len(rows) > BULK_COPY_THRESHOLD:
+                # Stream large imports through a binary COPY
+                cur.execute(BULK_COPY_STAGING_SQL)
+                with cur.copy(
+                    '''COPY transactions_import
+                       (user_id, type, category, amount, transaction_date, description, merchant)
+                       FROM STDIN WITH (FORMAT BINARY)'''
+                ) as copy:
+                    copy.set_types(TRANSACTION_COPY_TYPES)
+                    for row in rows:
+                        copy.write_row(row)
+                cur.execute(BULK_COPY_INSERT_SQL)
+                ids = [row[0] for row in cur.fetchall()]
+            else:
+                # executemany pipelines every INSERT in a single round-trip
+                cur.executemany(
+                    BULK_INSERT_TRANSACTION_SQL,
+                    rows,
+                    returning=True
+                )
+                ids = [cur.fetchone()[0]]
+                while cur.nextset():
+                    ids.append(cur.fetchone()[0])
+            invalidate_transactions_cache(user_id)
+
+            return jsonify({
+                'message': f'{len(rows)} transactions added successfully',
+                'count': len(rows),
+                'ids': ids
+            }), 201
+
+    except Exception as e:
+        app.logger.exception("Bulk add transactions error")
         return jsonify({'error': str(e)}), 500
 
+DELETE_TRANSACTION_SQL = 'DELETE FROM transactions WHERE id = %s AND user_id = %s RETURNING id'
+
 # Delete transaction
 @app.route('/api/transactions/<int:transaction_id>', methods=['DELETE'])
-@jwt_required()
+@jwt_cached
 def delete_transaction(transaction_id):
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        try:
-            cur = conn.cursor()
-            cur.execute(
-                'DELETE FROM transactions WHERE id = %s AND user_id = %s RETURNING id',
-                (transaction_id, user_id)
-            )
+        with db_cursor() as (conn, cur):
+            cur.execute(DELETE_TRANSACTION_SQL, (transaction_id, user_id))
             deleted = cur.fetchone()
             
             if not deleted:
                 return jsonify({'error': 'Transaction not found'}), 404
-            
-            conn.commit()
+            invalidate_transactions_cache(user_id)
             return jsonify({'message': 'Transaction deleted successfully'}), 200
             
-        finally:
-            cur.close()
-            conn.close()
-            
     except Exception as e:
-        print(f"Delete transaction error: {e}")
+        app.logger.exception("Delete transaction error")
         return jsonify({'error': str(e)}), 500
 
 # Get budgets
 @app.route('/api/budgets', methods=['GET'])
-@jwt_required()
+@jwt_cached
 def get_budgets():
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        try:
-            cur = conn.cursor()
-            cur.execute('SELECT * FROM budgets WHERE user_id = %s ORDER BY category', (user_id,))
-            budgets = cur.fetchall()
-            
-            return jsonify({'budgets': budgets}), 200
+        with db_cursor(row_factory=tuple_row) as (conn, cur):
+            cur.execute(
+                "SELECT COALESCE(json_agg(b ORDER BY category), '[]')::text FROM budgets b WHERE user_id = %s",
+                (user_id,)
+            )
             
-        finally:
-            cur.close()
-            conn.close()
+            return json_text_response('budgets', cur.fetchone()[0]), 200
             
     except Exception as e:
-        print(f"Get budgets error: {e}")
+        app.logger.exception("Get budgets error")
         return jsonify({'error': str(e)}), 500
 
 # Add budget
 @app.route('/api/budgets', methods=['POST'])
-@jwt_required()
+@jwt_cached
 def add_budget():
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         data = request.get_json()
         
         if not data:
@@ -583,68 +1005,51 @@ def add_budget():
         if not all([category, limit_amount]):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        try:
-            cur = conn.cursor()
+        with db_cursor() as (conn, cur):
             cur.execute(
                 '''INSERT INTO budgets (user_id, category, limit_amount, period)
                    VALUES (%s, %s, %s, %s)
                    ON CONFLICT (user_id, category)
-                   DO UPDATE SET limit_amount = EXCLUDED.limit_amount, period = EXCLUDED.period
+                   DO UPDATE SET limit_amount = EXCLUDED.limit_amount, period = EXCLUDED.period, updated_at = CURRENT_TIMESTAMP
                    RETURNING *''',
                 (user_id, category, limit_amount, period)
             )
             budget = cur.fetchone()
-            conn.commit()
             
             return jsonify({
                 'message': 'Budget created/updated successfully',
                 'budget': budget
             }), 201
             
-        finally:
-            cur.close()
-            conn.close()
-            
     except Exception as e:
-        print(f"Add budget error: {e}")
+        app.logger.exception("Add budget error")
         return jsonify({'error': str(e)}), 500
 
 # Get savings goals
 @app.route('/api/goals', methods=['GET'])
-@jwt_required()
+@jwt_cached
 def get_goals():
     try:
-        user_id = get_jwt_identity()
-        
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        user_id = current_user_id()
         
-        try:
-            cur = conn.cursor()
-            cur.execute('SELECT * FROM savings_goals WHERE user_id = %s ORDER BY deadline', (user_id,))
-            goals = cur.fetchall()
-            
-            return jsonify({'goals': goals}), 200
+        with db_cursor(row_factory=tuple_row) as (conn, cur):
+            cur.execute(
+                "SELECT COALESCE(json_agg(sg ORDER BY deadline), '[]')::text FROM savings_goals sg WHERE user_id = %s",
+                (user_id,)
+            )
             
-        finally:
-            cur.close()
-            conn.close()
+            return json_text_response('goals', cur.fetchone()[0]), 200
             
     except Exception as e:
-        print(f"Get goals error: {e}")
+        app.logger.exception("Get goals error")
         return jsonify({'error': str(e)}), 500
 
 # Add savings goal
 @app.route('/api/goals', methods=['POST'])
-@jwt_required()
+@jwt_cached
 def add_goal():
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         data = request.get_json()
         
         if not data:
@@ -658,12 +1063,7 @@ def add_goal():
         if not all([goal_name, target_amount, deadline]):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        try:
-            cur = conn.cursor()
+        with db_cursor() as (conn, cur):
             cur.execute(
                 '''INSERT INTO savings_goals (user_id, goal_name, target_amount, current_amount, deadline)
                    VALUES (%s, %s, %s, %s, %s)
@@ -671,73 +1071,171 @@ def add_goal():
                 (user_id, goal_name, target_amount, current_amount, deadline)
             )
             goal = cur.fetchone()
-            conn.commit()
             
             return jsonify({
                 'message': 'Goal created successfully',
                 'goal': goal
             }), 201
             
-        finally:
-            cur.close()
-            conn.close()
-            
     except Exception as e:
-        print(f"Add goal error: {e}")
+        app.logger.exception("Add goal error")
         return jsonify({'error': str(e)}), 500
 
+# Current month totals plus goal/budget counts in one round-trip
+DASHBOARD_SUMMARY_SQL = '''
+    WITH tx AS (
+        SELECT
+            COALESCE(SUM(amount) FILTER (WHERE type = 'income'), 0) as total_income,
+            COALESCE(SUM(amount) FILTER (WHERE type = 'expense'), 0) as total_expenses,
+            COUNT(*) as transaction_count
+        FROM transactions
+        WHERE user_id = %(user_id)s
+        AND transaction_date >= date_trunc('month', CURRENT_DATE)
+        AND transaction_date < date_trunc('month', CURRENT_DATE) + INTERVAL '1 month'
+    ),
+    goals AS (
+        SELECT COUNT(*) as active_goals FROM savings_goals WHERE user_id = %(user_id)s AND status = 'active'
+    ),
+    budgets AS (
+        SELECT COUNT(*) as active_budgets FROM budgets WHERE user_id = %(user_id)s
+    )
+    SELECT *, total_income - total_expenses AS net_balance FROM tx, goals, budgets
+'''
+
 # Get dashboard summary
 @app.route('/api/dashboard/summary', methods=['GET'])
-@jwt_required()
+@jwt_cached
 def get_dashboard_summary():
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        try:
-            cur = conn.cursor()
-            
-            # Get current month transactions
-            cur.execute('''
-                SELECT 
-                    SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END) as total_income,
-                    SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END) as total_expenses,
-                    COUNT(*) as transaction_count
-                FROM transactions
-                WHERE user_id = %s
-                AND EXTRACT(MONTH FROM transaction_date) = EXTRACT(MONTH FROM CURRENT_DATE)
-                AND EXTRACT(YEAR FROM transaction_date) = EXTRACT(YEAR FROM CURRENT_DATE)
-            ''', (user_id,))
+        with db_cursor() as (conn, cur):
+            cur.execute(DASHBOARD_SUMMARY_SQL, {'user_id': user_id})
             summary = cur.fetchone()
             
-            # Get active goals count
-            cur.execute('SELECT COUNT(*) as active_goals FROM savings_goals WHERE user_id = %s AND status = %s', (user_id, 'active'))
-            goals_count = cur.fetchone()
-            
-            # Get active budgets count
-            cur.execute('SELECT COUNT(*) as active_budgets FROM budgets WHERE user_id = %s', (user_id,))
-            budgets_count = cur.fetchone()
-            
             return jsonify({
                 'summary': {
-                    'total_income': float(summary['total_income'] or 0),
-                    'total_expenses': float(summary['total_expenses'] or 0),
-                    'net_balance': float((summary['total_income'] or 0) - (summary['total_expenses'] or 0)),
+                    'total_income': summary['total_income'],
+                    'total_expenses': summary['total_expenses'],
+                    'net_balance': summary['net_balance'],
                     'transaction_count': summary['transaction_count'],
-                    'active_goals': goals_count['active_goals'],
-                    'active_budgets': budgets_count['active_budgets']
+                    'active_goals': summary['active_goals'],
+                    'active_budgets': summary['active_budgets']
                 }
             }), 200
             
-        finally:
-            cur.close()
-            conn.close()
+    except Exception as e:
+        app.logger.exception("Dashboard summary error")
+        return jsonify({'error': str(e)}), 500
+
+# predictions pulls in numpy and pandas; load it on the first analytics
+# request so workers that only serve CRUD never pay for it
+_predictor = None
+
+def get_predictor():
+    global _predictor
+    if _predictor is None:
+        from predictions import FinancialPredictor
+        _predictor = FinancialPredictor()
+    return _predictor
+
+# Month-to-date spending per budgeted category, summed in Postgres so only
+# one row per budget comes back. Each budget's sum is an index-only scan of
+# the partial expense index on (user_id, category, transaction_date).
+# Yearly budgets are checked against their monthly share.
+BUDGET_RISK_SQL = '''
+    SELECT
+        b.category,
+        CASE WHEN b.period = 'yearly' THEN ROUND(b.limit_amount / 12, 2) ELSE b.limit_amount END AS monthly_limit,
+        COALESCE(SUM(t.amount), 0) AS spent
+    FROM budgets b
+    LEFT JOIN transactions t
+        ON t.user_id = b.user_id
+        AND t.category = b.category
+        AND t.type = 'expense'
+        AND t.transaction_date >= date_trunc('month', CURRENT_DATE)
+        AND t.transaction_date < date_trunc('month', CURRENT_DATE) + INTERVAL '1 month'
+    WHERE b.user_id = %s
+    GROUP BY b.category, b.period, b.limit_amount
+'''
+
+# Get budgets projected to overrun this month (a bare list, as the
+# dashboard expects)
+@app.route('/api/predictions/budget-risk', methods=['GET'])
+@jwt_cached
+def get_budget_risk():
+    try:
+        user_id = current_user_id()
+        
+        with db_cursor(row_factory=tuple_row) as (conn, cur):
+            cur.execute(BUDGET_RISK_SQL, (user_id,))
+            rows = cur.fetchall()
+        
+        at_risk = get_predictor().predict_budget_overrun_from_totals(
+            {category: spent for category, _, spent in rows},
+            {category: monthly_limit for category, monthly_limit, _ in rows}
+        )
+        return jsonify(at_risk), 200
             
     except Exception as e:
-        print(f"Dashboard summary error: {e}")
+        app.logger.exception("Budget risk error")
+        return jsonify({'error': str(e)}), 500
+
+# Active goals plus average monthly income/expenses over the user's three
+# most recent months with activity, in one round-trip. Left-joined from the
+# averages so a user with no goals still gets one (empty) row.
+GOALS_PROGRESS_SQL = '''
+    WITH monthly AS (
+        SELECT
+            COALESCE(SUM(amount) FILTER (WHERE type = 'income'), 0) AS income,
+            COALESCE(SUM(amount) FILTER (WHERE type = 'expense'), 0) AS expenses
+        FROM transactions
+        WHERE user_id = %(user_id)s
+        GROUP BY date_trunc('month', transaction_date)
+        ORDER BY date_trunc('month', transaction_date) DESC
+        LIMIT 3
+    ),
+    averages AS (
+        SELECT COALESCE(AVG(income), 0) AS avg_income, COALESCE(AVG(expenses), 0) AS avg_expenses
+        FROM monthly
+    )
+    SELECT g.id, g.goal_name, g.current_amount, g.target_amount, a.avg_income, a.avg_expenses
+    FROM averages a
+    LEFT JOIN savings_goals g ON g.user_id = %(user_id)s AND g.status = 'active'
+    ORDER BY g.deadline
+'''
+
+# Get savings timelines for every active goal
+@app.route('/api/analytics/goals-progress', methods=['GET'])
+@jwt_cached
+def get_goals_progress():
+    try:
+        user_id = current_user_id()
+        
+        with db_cursor(row_factory=tuple_row) as (conn, cur):
+            cur.execute(GOALS_PROGRESS_SQL, {'user_id': user_id})
+            rows = cur.fetchall()
+        
+        avg_income, avg_expenses = rows[0][4], rows[0][5]
+        goals = [row for row in rows if row[0] is not None]
+        timelines = get_predictor().calculate_savings_goal_timelines(
+            [row[2] for row in goals],
+            [row[3] for row in goals],
+            avg_income,
+            avg_expenses
+        )
+        
+        return jsonify({
+            'goals_progress': [
+                {'id': row[0], 'goal_name': row[1], **timeline}
+                for row, timeline in zip(goals, timelines)
+            ],
+            'monthly_income': round(avg_income, 2),
+            'monthly_expenses': round(avg_expenses, 2)
+        }), 200
+            
+    except Exception as e:
+        app.logger.exception("Goals progress error")
         return jsonify({'error': str(e)}), 500
 
 # Initialize database on startup
@@ -747,10 +1245,15 @@ try:
     print(f"PORT: {os.environ.get('PORT', 'NOT SET')}")
     print(f"DATABASE_URL: {'SET' if os.environ.get('DATABASE_URL') else 'NOT SET'}")
     print("="*60)
+except Exception:
+    app.logger.exception("Startup initialization failed")
+
+# Outside the try: a failed migration aborts boot instead of serving
+# requests against an unmigrated schema
+if os.environ.get('RUN_MIGRATIONS') == '1':
     init_db()
-except Exception as e:
-    print(f"⚠️ Startup initialization failed: {e}")
 
+# Development server only; production runs `gunicorn -c gunicorn_config.py app:app`
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
     print(f"🌐 Starting Flask app on 0.0.0.0:{port}")
@@ -1,12 +1,29 @@
 # gunicorn_config.py
-import multiprocessing
+# Patch the stdlib before the app is preloaded so psycopg, its connection
+# pool and socket reads all yield to gevent's hub instead of blocking
+from gevent import monkey
+monkey.patch_all()
 
-# Render free tier has limited memory, use fewer workers
-workers = 2  # Use only 1 worker on free tier
-worker_class = "sync"
-worker_connections = 1000
+import os
+
+# Render free tier has limited memory, use fewer workers. gevent workers
+# multiplex requests, so a few go a long way; WEB_CONCURRENCY overrides.
+# Not sized from cpu_count(): in a container it reports the host's cores,
+# and each worker holds up to DB_POOL_MAX connections plus a LISTEN one.
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Every request waits on Postgres, so let each worker overlap many of them.
+# Keep workers x DB_POOL_MAX below the database's max_connections.
+worker_class = "gevent"
+worker_connections = 500
 timeout = 60  # Increase timeout to 120 seconds
-keepalive = 5
+# Reuse client connections (and their TLS sessions) across requests
+keepalive = 30
+# Give in-flight requests time to finish on deploy/restart
+graceful_timeout = 30
+
+# Worker heartbeat files on tmpfs; a stalled disk would otherwise get
+# healthy workers killed by the master
+worker_tmp_dir = "/dev/shm"
 
 # Preload app to reduce memory usage per worker
 preload_app = True
@@ -16,4 +33,9 @@ max_requests = 1000
 max_requests_jitter = 50
 
 # Binding
-bind = "0.0.0.0:10000"
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+
+# Shut the worker's connection pool down while the gevent hub is still alive
+def worker_exit(server, worker):
+    from app import close_pool
+    close_pool()
@@ -0,0 +1,357 @@
+# Database schema migrations - run once per deploy with `python migrate.py`
+import psycopg
+import os
+import sys
+
+# Bump whenever the DDL in init_db changes; a database already at this
+# version is left alone
+CURRENT_SCHEMA_VERSION = 7
+
+# Database connection with timeout
+def get_db_connection():
+    try:
+        conn = psycopg.connect(
+            # DDL goes straight to Postgres, not through pgbouncer
+            os.environ.get('DATABASE_DIRECT_URL') or os.environ.get('DATABASE_URL'),
+            connect_timeout=10
+        )
+        return conn
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
+
+# Initialize database schema. Raises on failure so a deploy never runs
+# against a schema that was not migrated.
+def init_db():
+    """Run the complete PostgreSQL schema"""
+    conn = get_db_connection()
+    if not conn:
+        print("❌ Cannot connect to database")
+        raise RuntimeError('Cannot connect to database')
+    
+    try:
+        cur = conn.cursor()
+        
+        # One round-trip on the common up-to-date path; a fresh database has
+        # no schema_version table yet
+        try:
+            cur.execute('SELECT MAX(version) FROM schema_version')
+            version = cur.fetchone()[0]
+        except psycopg.errors.UndefinedTable:
+            conn.rollback()
+            version = None
+        if version is not None and version >= CURRENT_SCHEMA_VERSION:
+            print(f"✅ Database schema is up to date (version {version})")
+            return
+        
+        print("📦 Creating database schema...")
+        
+        # Each block below is sent as one multi-statement execute
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE EXTENSION IF NOT EXISTS "uuid-ossp"
+        ''')
+        
+        # Users Table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                email VARCHAR(255) UNIQUE NOT NULL,
+                password_hash VARCHAR(255) NOT NULL,
+                name VARCHAR(100) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            -- Emails are matched case-insensitively; the UNIQUE constraint
+            -- already indexes the raw column, so the plain index is redundant
+            DROP INDEX IF EXISTS idx_users_email;
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_lower ON users(lower(email))
+        ''')
+        print("✅ Users table created")
+        
+        # Transactions Table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                type VARCHAR(10) NOT NULL CHECK (type IN ('income', 'expense')),
+                category VARCHAR(50) NOT NULL,
+                amount NUMERIC(10, 2) NOT NULL,
+                transaction_date DATE NOT NULL,
+                description TEXT,
+                merchant VARCHAR(100),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+            -- Serves the "recent transactions" list in order with no sort node, and
+            -- per-user date range scans, so the old (user_id, transaction_date)
+            -- index goes. id is part of the key so keyset pages seek straight to
+            -- their cursor. description (unbounded TEXT) is left out of INCLUDE:
+            -- a long one would push the index tuple past btree's size limit and
+            -- fail the insert
+            DROP INDEX IF EXISTS idx_transactions_user_date;
+            DROP INDEX IF EXISTS idx_transactions_user_recent;
+            DROP INDEX IF EXISTS idx_transactions_user_keyset;
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_page
+            ON transactions(user_id, transaction_date DESC, created_at DESC, id DESC)
+            INCLUDE (type, category, amount, merchant, updated_at);
+            CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(category);
+            -- Type is only ever filtered within one user's rows
+            DROP INDEX IF EXISTS idx_transactions_type;
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_type ON transactions(user_id, type);
+            -- Per-category expense sums over a date range (budget risk) as an
+            -- index-only scan
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_expense_category
+            ON transactions(user_id, category, transaction_date) INCLUDE (amount)
+            WHERE type = 'expense'
+        ''')
+        print("✅ Transactions table created")
+        
+        # Budgets Table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS budgets (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                category VARCHAR(50) NOT NULL,
+                limit_amount NUMERIC(10, 2) NOT NULL,
+                period VARCHAR(10) DEFAULT 'monthly' CHECK (period IN ('monthly', 'yearly')),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                UNIQUE (user_id, category)
+            );
+            CREATE INDEX IF NOT EXISTS idx_budgets_user ON budgets(user_id)
+        ''')
+        print("✅ Budgets table created")
+        
+        # Savings Goals Table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS savings_goals (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                goal_name VARCHAR(100) NOT NULL,
+                target_amount NUMERIC(10, 2) NOT NULL,
+                current_amount NUMERIC(10, 2) DEFAULT 0.00,
+                deadline DATE NOT NULL,
+                status VARCHAR(20) DEFAULT 'active' CHECK (status IN ('active', 'completed', 'cancelled')),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+            CREATE INDEX IF NOT EXISTS idx_savings_goals_user ON savings_goals(user_id);
+            -- Goal lookups only ever filter active goals; a partial index keeps them dense
+            DROP INDEX IF EXISTS idx_savings_goals_status;
+            CREATE INDEX IF NOT EXISTS idx_savings_goals_user_active ON savings_goals(user_id) WHERE status = 'active'
+        ''')
+        print("✅ Savings goals table created")
+        
+        # Categories Reference Table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS categories (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(50) UNIQUE NOT NULL,
+                type VARCHAR(10) DEFAULT 'both' CHECK (type IN ('income', 'expense', 'both')),
+                icon VARCHAR(50),
+                color VARCHAR(20),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            -- Default categories
+            INSERT INTO categories (name, type, icon, color) 
+            SELECT * FROM (VALUES
+                ('Salary', 'income', 'briefcase', '#10b981'),
+                ('Freelance', 'income', 'laptop', '#3b82f6'),
+                ('Investments', 'income', 'trending-up', '#8b5cf6'),
+                ('Other Income', 'income', 'dollar-sign', '#06b6d4'),
+                ('Food & Dining', 'expense', 'utensils', '#ef4444'),
+                ('Transportation', 'expense', 'car', '#f59e0b'),
+                ('Shopping', 'expense', 'shopping-bag', '#ec4899'),
+                ('Entertainment', 'expense', 'film', '#8b5cf6'),
+                ('Utilities', 'expense', 'zap', '#10b981'),
+                ('Healthcare', 'expense', 'heart', '#ef4444'),
+                ('Education', 'expense', 'book', '#3b82f6'),
+                ('Travel', 'expense', 'plane', '#06b6d4'),
+                ('Insurance', 'expense', 'shield', '#6366f1'),
+                ('Subscriptions', 'expense', 'refresh-cw', '#f59e0b'),
+                ('Other', 'both', 'more-horizontal', '#6b7280')
+            ) AS v(name, type, icon, color)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM categories WHERE categories.name = v.name
+            )
+        ''')
+        print("✅ Categories table created")
+        
+        # Notifications Table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS notifications (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                title VARCHAR(200) NOT NULL,
+                message TEXT NOT NULL,
+                type VARCHAR(20) NOT NULL CHECK (type IN ('budget_alert', 'goal_reminder', 'insight', 'general')),
+                is_read BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+            CREATE INDEX IF NOT EXISTS idx_notifications_user_read ON notifications(user_id, is_read);
+            CREATE INDEX IF NOT EXISTS idx_notifications_user_unread ON notifications(user_id) WHERE is_read = FALSE
+        ''')
+        print("✅ Notifications table created")
+        
+        # User Preferences Table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS user_preferences (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER UNIQUE NOT NULL,
+                currency VARCHAR(10) DEFAULT 'INR',
+                budget_alert_threshold INTEGER DEFAULT 80,
+                enable_notifications BOOLEAN DEFAULT TRUE,
+                theme VARCHAR(10) DEFAULT 'light' CHECK (theme IN ('light', 'dark', 'auto')),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        ''')
+        print("✅ User preferences table created")
+        
+        # Recurring Transactions Table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_transactions (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                type VARCHAR(10) NOT NULL CHECK (type IN ('income', 'expense')),
+                category VARCHAR(50) NOT NULL,
+                amount NUMERIC(10, 2) NOT NULL,
+                description TEXT,
+                merchant VARCHAR(100),
+                frequency VARCHAR(10) NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly', 'yearly')),
+                start_date DATE NOT NULL,
+                end_date DATE,
+                is_active BOOLEAN DEFAULT TRUE,
+                last_processed DATE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+            CREATE INDEX IF NOT EXISTS idx_recurring_transactions_user_active ON recurring_transactions(user_id, is_active)
+        ''')
+        print("✅ Recurring transactions table created")
+        
+        # Financial Insights Cache Table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS insights_cache (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                insight_type VARCHAR(50) NOT NULL,
+                insight_data JSONB NOT NULL,
+                valid_until TIMESTAMP NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+            CREATE INDEX IF NOT EXISTS idx_insights_cache_user_type ON insights_cache(user_id, insight_type);
+            CREATE INDEX IF NOT EXISTS idx_insights_cache_valid ON insights_cache(valid_until)
+        ''')
+        print("✅ Insights cache table created")
+        
+        # Logged-out JWTs, kept until they would have expired anyway
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS revoked_tokens (
+                jti VARCHAR(64) PRIMARY KEY,
+                expires_at TIMESTAMP NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires ON revoked_tokens(expires_at)
+        ''')
+        print("✅ Revoked tokens table created")
+        
+        # updated_at is set by the UPDATE statements themselves; drop the old
+        # per-row plpgsql triggers that used to do it
+        tables_with_updated_at = ['users', 'transactions', 'budgets', 'savings_goals', 'user_preferences', 'recurring_transactions']
+        cur.execute(';'.join(
+            f'DROP TRIGGER IF EXISTS update_{table}_updated_at ON {table}' for table in tables_with_updated_at
+        ) + '; DROP FUNCTION IF EXISTS update_updated_at_column()')
+        
+        # Tell the API workers to drop their cached categories on any change
+        cur.execute('''
+            CREATE OR REPLACE FUNCTION notify_categories_changed()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                PERFORM pg_notify('categories_changed', '');
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            DROP TRIGGER IF EXISTS categories_changed ON categories;
+            CREATE TRIGGER categories_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON categories
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_categories_changed()
+        ''')
+        
+        # Per-user invalidation of the API workers' cached transaction pages.
+        # Statement-level with transition tables: one NOTIFY per affected user
+        # per statement, however many rows a bulk import touches.
+        cur.execute('''
+            CREATE OR REPLACE FUNCTION notify_transactions_changed()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    PERFORM pg_notify('transactions_changed', user_id::text)
+                    FROM (SELECT DISTINCT user_id FROM old_rows) u;
+                ELSE
+                    PERFORM pg_notify('transactions_changed', user_id::text)
+                    FROM (SELECT DISTINCT user_id FROM new_rows) u;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            DROP TRIGGER IF EXISTS transactions_inserted ON transactions;
+            CREATE TRIGGER transactions_inserted
+            AFTER INSERT ON transactions REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_transactions_changed();
+            DROP TRIGGER IF EXISTS transactions_updated ON transactions;
+            CREATE TRIGGER transactions_updated
+            AFTER UPDATE ON transactions REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_transactions_changed();
+            DROP TRIGGER IF EXISTS transactions_deleted ON transactions;
+            CREATE TRIGGER transactions_deleted
+            AFTER DELETE ON transactions REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_transactions_changed()
+        ''')
+        
+        # Every API worker adds a revoked token to its in-memory blocklist
+        cur.execute('''
+            CREATE OR REPLACE FUNCTION notify_token_revoked()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                PERFORM pg_notify('tokens_revoked', NEW.jti);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            DROP TRIGGER IF EXISTS token_revoked ON revoked_tokens;
+            CREATE TRIGGER token_revoked
+            AFTER INSERT ON revoked_tokens
+            FOR EACH ROW EXECUTE FUNCTION notify_token_revoked()
+        ''')
+        print("✅ Triggers created")
+        
+        # Fresh statistics so the planner picks up the new indexes right away
+        cur.execute('ANALYZE users; ANALYZE transactions')
+        
+        cur.execute('INSERT INTO schema_version (version) VALUES (%s)', (CURRENT_SCHEMA_VERSION,))
+        conn.commit()
+        cur.close()
+        print("✅ Database schema initialized successfully!")
+        
+    except Exception as e:
+        print(f"❌ Database initialization error: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    try:
+        init_db()
+    except Exception:
+        sys.exit(1)
@@ -1,20 +1,29 @@
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression, Ridge
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from datetime import datetime, timedelta
+from datetime import datetime
 import calendar
-import json
+
+def _as_datetime(dates):
+    """Parse a date column unless it already holds datetime64 values"""
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates
+    return pd.to_datetime(dates)
+
+def _current_month_mask(dates):
+    """Boolean mask of dates in the current calendar month"""
+    month_start = pd.Timestamp(datetime.now().date().replace(day=1))
+    return (dates >= month_start) & (dates < month_start + pd.DateOffset(months=1))
 
 class FinancialPredictor:
     """
-    Advanced financial prediction models for personal finance tracking
+    Advanced financial prediction models for personal finance tracking.
+    
+    Holds no state: one instance is shared by every request in a worker, and
+    methods never modify the DataFrames they are given.
     """
     
-    def __init__(self):
-        self.scaler = StandardScaler()
-        
+    __slots__ = ()
+    
     def predict_cash_flow(self, transactions_df):
         """
         Predict end-of-month balance based on current spending patterns
@@ -29,17 +38,13 @@ class FinancialPredictor:
             return {"error": "Insufficient data for prediction"}
         
         # Prepare data
-        transactions_df['date'] = pd.to_datetime(transactions_df['date'])
-        transactions_df['day'] = transactions_df['date'].dt.day
+        transactions_df = transactions_df.assign(date=_as_datetime(transactions_df['date']))
         
         current_month = datetime.now().month
         current_year = datetime.now().year
         
         # Filter current month
-        current_month_data = transactions_df[
-            (transactions_df['date'].dt.month == current_month) & 
-            (transactions_df['date'].dt.year == current_year)
-        ]
+        current_month_data = transactions_df[_current_month_mask(transactions_df['date'])]
         
         # Calculate daily spending rate
         income = current_month_data[current_month_data['type'] == 'income']['amount'].sum()
@@ -99,7 +104,7 @@ class FinancialPredictor:
             return {"error": "Insufficient data for category prediction"}
         
         # Group by month
-        category_data['date'] = pd.to_datetime(category_data['date'])
+        category_data['date'] = _as_datetime(category_data['date'])
         monthly_spending = category_data.groupby(
             [category_data['date'].dt.year, category_data['date'].dt.month]
         )['amount'].sum().reset_index()
@@ -107,7 +112,11 @@ class FinancialPredictor:
         monthly_spending.columns = ['year', 'month', 'amount']
         monthly_spending['month_num'] = range(len(monthly_spending))
         
-        # Train linear regression
+        # Train linear regression. sklearn is imported here, not at module
+        # level: it is only needed for this method and costs seconds and tens
+        # of MB to load in every worker.
+        from sklearn.linear_model import LinearRegression
+        
         X = monthly_spending[['month_num']].values
         y = monthly_spending['amount'].values
         
@@ -184,6 +193,27 @@ class FinancialPredictor:
             transactions_df: DataFrame with current month transactions
             budgets_dict: Dictionary of {category: budget_limit}
             
+        Returns:
+            list: Categories at risk with predictions
+        """
+        transactions_df = transactions_df.assign(date=_as_datetime(transactions_df['date']))
+        current_month_expenses = transactions_df[
+            _current_month_mask(transactions_df['date']) &
+            (transactions_df['type'] == 'expense')
+        ]
+        category_totals = current_month_expenses.groupby('category')['amount'].sum().to_dict()
+        
+        return self.predict_budget_overrun_from_totals(category_totals, budgets_dict)
+    
+    def predict_budget_overrun_from_totals(self, category_totals, budgets_dict):
+        """
+        Predict which budgets are likely to be exceeded from spending that
+        has already been summed per category (e.g. by a SQL GROUP BY)
+        
+        Args:
+            category_totals: Dictionary of {category: current month expenses}
+            budgets_dict: Dictionary of {category: budget_limit}
+            
         Returns:
             list: Categories at risk with predictions
         """
@@ -194,17 +224,8 @@ class FinancialPredictor:
         
         at_risk = []
         
-        transactions_df['date'] = pd.to_datetime(transactions_df['date'])
-        current_month_expenses = transactions_df[
-            (transactions_df['date'].dt.month == current_month) & 
-            (transactions_df['date'].dt.year == current_year) &
-            (transactions_df['type'] == 'expense')
-        ]
-        
         for category, budget_limit in budgets_dict.items():
-            cat_expenses = current_month_expenses[
-                current_month_expenses['category'] == category
-            ]['amount'].sum()
+            cat_expenses = category_totals.get(category, 0)
             
             # Project to end of month
             daily_rate = cat_expenses / current_day if current_day > 0 else 0
@@ -237,44 +258,64 @@ class FinancialPredictor:
         Returns:
             dict: Timeline and recommendations
         """
-        remaining = target_amount - current_amount
-        
-        if remaining <= 0:
-            return {
-                "status": "achieved",
-                "message": "Goal already reached!"
-            }
+        return self.calculate_savings_goal_timelines(
+            [current_amount], [target_amount], monthly_income, monthly_expenses
+        )[0]
+    
+    def calculate_savings_goal_timelines(self, current_amounts, target_amounts,
+                                        monthly_income, monthly_expenses):
+        """
+        Calculate timelines for many goals at once, evaluated on arrays
         
+        Args:
+            current_amounts: Current savings per goal (None counts as 0)
+            target_amounts: Goal amount per goal
+            monthly_income: Average monthly income
+            monthly_expenses: Average monthly expenses
+            
+        Returns:
+            list: Timeline and recommendations per goal, in input order
+        """
+        # current_amount is nullable in savings_goals
+        current = np.array([0 if c is None else c for c in current_amounts], dtype=np.float64)
+        remaining = np.asarray(target_amounts, dtype=np.float64) - current
         monthly_surplus = monthly_income - monthly_expenses
+        achieved = {"status": "achieved", "message": "Goal already reached!"}
         
         if monthly_surplus <= 0:
-            return {
+            impossible = {
                 "status": "impossible",
                 "message": "Current spending exceeds income. Reduce expenses first.",
                 "recommendation": "Cut expenses by at least " + str(round(abs(monthly_surplus) + 100, 2))
             }
-        
-        # Conservative estimate (70% of surplus)
-        conservative_monthly = monthly_surplus * 0.7
-        conservative_months = remaining / conservative_monthly if conservative_monthly > 0 else float('inf')
-        
-        # Aggressive estimate (90% of surplus)
-        aggressive_monthly = monthly_surplus * 0.9
-        aggressive_months = remaining / aggressive_monthly if aggressive_monthly > 0 else float('inf')
-        
-        return {
-            "status": "achievable",
-            "remaining_amount": round(remaining, 2),
-            "conservative_timeline": {
-                "months": round(conservative_months, 1),
-                "monthly_savings": round(conservative_monthly, 2)
-            },
-            "aggressive_timeline": {
-                "months": round(aggressive_months, 1),
-                "monthly_savings": round(aggressive_monthly, 2)
-            },
-            "recommendation": f"Save {round(conservative_monthly, 2)} per month for comfortable progress"
-        }
+            return [dict(achieved) if r <= 0 else dict(impossible) for r in remaining.tolist()]
+        
+        # Conservative (70% of surplus) and aggressive (90%) estimates
+        conservative_monthly = round(monthly_surplus * 0.7, 2)
+        aggressive_monthly = round(monthly_surplus * 0.9, 2)
+        conservative_months = np.round(remaining / (monthly_surplus * 0.7), 1).tolist()
+        aggressive_months = np.round(remaining / (monthly_surplus * 0.9), 1).tolist()
+        
+        timelines = []
+        for r, conservative, aggressive in zip(remaining.tolist(), conservative_months, aggressive_months):
+            if r <= 0:
+                timelines.append(dict(achieved))
+                continue
+            timelines.append({
+                "status": "achievable",
+                "remaining_amount": round(r, 2),
+                "conservative_timeline": {
+                    "months": conservative,
+                    "monthly_savings": conservative_monthly
+                },
+                "aggressive_timeline": {
+                    "months": aggressive,
+                    "monthly_savings": aggressive_monthly
+                },
+                "recommendation": f"Save {conservative_monthly} per month for comfortable progress"
+            })
+        
+        return timelines
     
     def identify_subscription_waste(self, transactions_df):
         """
@@ -287,7 +328,7 @@ class FinancialPredictor:
             list: Suspicious subscriptions
         """
         # Look for recurring patterns
-        transactions_df['date'] = pd.to_datetime(transactions_df['date'])
+        transactions_df = transactions_df.assign(date=_as_datetime(transactions_df['date']))
         
         # Group by merchant and amount
         recurring = transactions_df.groupby(['merchant', 'amount']).agg({
@@ -327,31 +368,36 @@ class FinancialPredictor:
         Returns:
             dict: Various insights and recommendations
         """
-        transactions_df['date'] = pd.to_datetime(transactions_df['date'])
+        # Work on a shallow view with parsed dates; the caller's frame is
+        # left untouched and no helper columns are added
+        df = transactions_df.assign(date=_as_datetime(transactions_df['date']))
+        day_of_week = df['date'].dt.dayofweek.to_numpy()
+        amounts = df['amount'].to_numpy(dtype=float)
+        is_expense = (df['type'] == 'expense').to_numpy()
         
-        # Time-based patterns
-        transactions_df['day_of_week'] = transactions_df['date'].dt.day_name()
-        transactions_df['hour'] = transactions_df['date'].dt.hour if 'time' in transactions_df.columns else 12
+        # Time-based patterns: total per weekday (Monday=0) in one pass
+        day_totals = np.bincount(day_of_week, weights=amounts, minlength=7)
         
         insights = {
-            "top_spending_day": transactions_df.groupby('day_of_week')['amount'].sum().idxmax(),
-            "weekend_vs_weekday": self._weekend_analysis(transactions_df),
-            "monthly_trend": self._calculate_trend(transactions_df),
-            "category_concentration": self._category_concentration(transactions_df),
-            "impulse_spending_score": self._calculate_impulse_score(transactions_df)
+            "top_spending_day": calendar.day_name[int(day_totals.argmax())],
+            "weekend_vs_weekday": self._weekend_analysis(day_of_week >= 5, amounts, is_expense),
+            "monthly_trend": self._calculate_trend(df),
+            "category_concentration": self._category_concentration(df),
+            "impulse_spending_score": self._calculate_impulse_score(df)
         }
         
         return insights
     
-    def _weekend_analysis(self, df):
+    def _weekend_analysis(self, is_weekend, amounts, is_expense):
         """Compare weekend vs weekday spending"""
-        df['is_weekend'] = df['date'].dt.dayofweek >= 5
-        weekend_avg = float(df[df['is_weekend'] & (df['type'] == 'expense')]['amount'].mean() or 0)
-        weekday_avg = float(df[~df['is_weekend'] & (df['type'] == 'expense')]['amount'].mean() or 0)
+        weekend = amounts[is_weekend & is_expense]
+        weekday = amounts[~is_weekend & is_expense]
+        weekend_avg = float(weekend.mean()) if len(weekend) else 0
+        weekday_avg = float(weekday.mean()) if len(weekday) else 0
         
         return {
-            "weekend_avg": round(weekend_avg, 2) if not np.isnan(weekend_avg) else 0,
-            "weekday_avg": round(weekday_avg, 2) if not np.isnan(weekday_avg) else 0,
+            "weekend_avg": round(weekend_avg, 2),
+            "weekday_avg": round(weekday_avg, 2),
             "difference_pct": round((weekend_avg / weekday_avg - 1) * 100, 1) if weekday_avg > 0 else 0
         }
     
@@ -399,7 +445,7 @@ class FinancialPredictor:
     
     def _calculate_impulse_score(self, df):
         """Estimate impulse spending based on transaction patterns"""
-        expenses = df[df['type'] == 'expense'].copy()
+        expenses = df[df['type'] == 'expense']
         
         if len(expenses) < 10:
             return 0